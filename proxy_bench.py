@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理压测脚本
+通过当前配置的系统代理并发建立HTTP CONNECT/SOCKS5隧道到本地回显或HTTP服务，
+逐级提升并发数，统计吞吐量、隧道建立延迟分位数、错误率和饱和点
+结果保存为JSON，便于对比不同代理客户端及版本
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import platform
+import sys
+import time
+from collections import Counter
+
+from proxy_tunnel import (
+    ProxyError,
+    format_host_port,
+    format_proxy,
+    non_negative_float,
+    open_tunnel,
+    parse_host_port,
+    parse_proxy_url,
+    positive_float,
+    positive_int,
+    ratio,
+    run_async,
+)
+from system_proxy import SystemProxyManager
+
+
+async def handle_echo(reader, writer):
+    """回显服务：原样返回收到的数据"""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def handle_http(reader, writer):
+    """HTTP服务：读取请求头后返回固定的200响应"""
+    try:
+        await reader.readuntil(b"\r\n\r\n")
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\nConnection: close\r\n\r\nok")
+        await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+        pass
+    finally:
+        writer.close()
+
+
+SINK_HANDLERS = {
+    'echo': handle_echo,
+    'http': handle_http,
+}
+
+
+async def exchange(reader, writer, mode, host, payload):
+    """通过隧道完成一次请求，返回响应是否正确"""
+    if mode == 'echo':
+        writer.write(payload)
+        await writer.drain()
+        return await reader.readexactly(len(payload)) == payload
+
+    writer.write(f"GET / HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode('utf-8'))
+    await writer.drain()
+    response = await reader.read()
+    return response.split(b"\r\n", 1)[0].split(None, 2)[1:2] == [b"200"]
+
+
+def classify_error(exc):
+    """将异常归类为错误类型"""
+    # Python 3.11起 asyncio.TimeoutError 是 OSError 的子类，需先判断
+    if isinstance(exc, asyncio.TimeoutError):
+        return 'timeout'
+    if isinstance(exc, ProxyError):
+        return 'proxy'
+    if isinstance(exc, (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError)):
+        return 'connection'
+    return 'os'
+
+
+def percentile(sorted_values, pct):
+    """计算分位数（最近秩法）"""
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(pct / 100.0 * len(sorted_values))) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def latency_summary(values):
+    """汇总延迟（毫秒）"""
+    ordered = sorted(value * 1000 for value in values)
+    if not ordered:
+        return None
+    return {
+        'min': round(ordered[0], 3),
+        'mean': round(sum(ordered) / len(ordered), 3),
+        'p50': round(percentile(ordered, 50), 3),
+        'p90': round(percentile(ordered, 90), 3),
+        'p99': round(percentile(ordered, 99), 3),
+        'max': round(ordered[-1], 3),
+    }
+
+
+async def run_level(proxy, host, port, mode, concurrency, duration, timeout, payload):
+    """以固定并发数持续压测一段时间，返回该级别的统计结果"""
+    setup_times = []
+    total_times = []
+    errors = Counter()
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                reader, writer = await open_tunnel(proxy, host, port, timeout)
+                setup = time.perf_counter() - started
+                try:
+                    ok = await asyncio.wait_for(exchange(reader, writer, mode, host, payload), timeout)
+                finally:
+                    writer.close()
+            except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError, ProxyError) as e:
+                errors[classify_error(e)] += 1
+                continue
+            if not ok:
+                errors['bad_response'] += 1
+                continue
+            setup_times.append(setup)
+            total_times.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    succeeded = len(total_times)
+    failed = sum(errors.values())
+    attempts = succeeded + failed
+    return {
+        'concurrency': concurrency,
+        'elapsed_s': round(elapsed, 3),
+        'requests': succeeded,
+        'errors': failed,
+        'error_rate': round(failed / attempts, 4) if attempts else 0.0,
+        'rps': round(succeeded / elapsed, 2) if elapsed else 0.0,
+        'setup_ms': latency_summary(setup_times),
+        'total_ms': latency_summary(total_times),
+        'error_breakdown': dict(errors),
+    }
+
+
+def find_saturation(levels, min_gain, max_error_rate):
+    """查找饱和点：吞吐量不再明显提升或错误率超限之前的最后一级"""
+    best = None
+    for level in levels:
+        if level['error_rate'] > max_error_rate:
+            reason = 'error_rate'
+        elif best is not None and level['rps'] < best['rps'] * (1 + min_gain):
+            reason = 'throughput_plateau'
+        else:
+            best = level
+            continue
+        return {
+            'concurrency': best['concurrency'] if best else None,
+            'rps': best['rps'] if best else None,
+            'reason': reason,
+            'detected_at': level['concurrency'],
+        }
+    return None
+
+
+def print_level(level):
+    """打印单级结果"""
+    setup = level['setup_ms'] or {}
+    print(
+        f"{level['concurrency']:>6} {level['rps']:>10.1f} "
+        f"{setup.get('p50', 0):>9.2f} {setup.get('p90', 0):>9.2f} {setup.get('p99', 0):>9.2f} "
+        f"{level['error_rate'] * 100:>7.2f}%"
+    )
+
+
+async def run_benchmark(args, proxy, result):
+    """启动本地服务并逐级压测，结果逐级写入 result"""
+    server = None
+    connections = set()
+
+    async def sink(reader, writer):
+        connections.add(writer)
+        try:
+            await SINK_HANDLERS[args.mode](reader, writer)
+        finally:
+            connections.discard(writer)
+
+    if args.target:
+        host, port = parse_host_port(args.target)
+    else:
+        server = await asyncio.start_server(sink, '127.0.0.1', 0, backlog=1024)
+        host, port = server.sockets[0].getsockname()[:2]
+        print(f"🎯 本地{args.mode}服务已启动: {format_host_port(host, port)}")
+
+    result['target'] = format_host_port(host, port)
+    payload = os.urandom(args.payload_size)
+    levels = result['levels']
+
+    print(f"\n{'并发':>6} {'请求/秒':>10} {'建立p50':>9} {'建立p90':>9} {'建立p99':>9} {'错误率':>8}")
+    print("-" * 60)
+    try:
+        for concurrency in args.concurrency:
+            level = await run_level(
+                proxy, host, port, args.mode, concurrency,
+                args.duration, args.timeout, payload
+            )
+            levels.append(level)
+            print_level(level)
+
+            result['saturation'] = find_saturation(levels, args.min_gain, args.max_error_rate)
+            if result['saturation'] and not args.full:
+                break
+    except asyncio.CancelledError:
+        # Python 3.11起 Ctrl+C 会取消主协程，保留已完成的级别
+        result['interrupted'] = True
+    finally:
+        if server is not None:
+            server.close()
+            # 先关闭代理尚未释放的连接：Python 3.12.1起 wait_closed() 会等待所有活动连接结束
+            for writer in list(connections):
+                writer.close()
+            for _ in range(100):
+                if not connections:
+                    break
+                await asyncio.sleep(0.01)
+            await server.wait_closed()
+
+
+def parse_concurrency(value):
+    """解析逗号分隔的并发级别"""
+    try:
+        levels = [int(item) for item in value.split(',') if item.strip()]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"并发级别应为逗号分隔的整数: {value}")
+    if not levels or any(level <= 0 for level in levels):
+        raise argparse.ArgumentTypeError(f"并发级别必须为正整数: {value}")
+    return levels
+
+
+def build_parser():
+    """构建命令行参数"""
+    parser = argparse.ArgumentParser(description="代理压测工具：逐级提升并发，测量代理的承载能力")
+    parser.add_argument('--proxy', help="代理地址，默认读取当前系统代理 (例如: socks5://127.0.0.1:10808)")
+    parser.add_argument('--protocol', choices=['http', 'socks5', 'socks4'], default='http',
+                        help="代理地址未带协议前缀时使用的协议 (默认: http)")
+    parser.add_argument('--mode', choices=sorted(SINK_HANDLERS), default='echo',
+                        help="隧道内的请求类型 (默认: echo)")
+    parser.add_argument('--target', help="使用已有的 主机:端口 作为目标，不启动本地服务")
+    parser.add_argument('--concurrency', type=parse_concurrency, default=[1, 2, 4, 8, 16, 32, 64, 128],
+                        help="并发级别，逗号分隔 (默认: 1,2,4,8,16,32,64,128)")
+    parser.add_argument('--duration', type=positive_float, default=5.0, help="每级持续秒数 (默认: 5)")
+    parser.add_argument('--timeout', type=positive_float, default=10.0, help="单次连接及请求超时秒数 (默认: 10)")
+    parser.add_argument('--payload-size', type=positive_int, default=64, help="echo模式每次发送的字节数 (默认: 64)")
+    parser.add_argument('--min-gain', type=non_negative_float, default=0.05,
+                        help="吞吐量提升低于该比例视为饱和 (默认: 0.05)")
+    parser.add_argument('--max-error-rate', type=ratio, default=0.01,
+                        help="错误率高于该值视为饱和 (默认: 0.01)")
+    parser.add_argument('--full', action='store_true', help="检测到饱和后继续跑完所有级别")
+    parser.add_argument('--label', help="结果标签，例如代理客户端名称及版本")
+    parser.add_argument('--output', help="结果JSON文件路径 (默认: proxy_bench_<时间>.json)")
+    return parser
+
+
+def main(argv=None):
+    """主函数"""
+    args = build_parser().parse_args(argv)
+
+    print("🔧 代理压测工具")
+    print("=" * 60)
+
+    proxy_url = args.proxy
+    if not proxy_url:
+        has_proxy, proxy_url = SystemProxyManager().get_current_proxy()
+        if not has_proxy or not proxy_url:
+            print("❌ 未检测到系统代理，请使用 --proxy 指定要压测的代理地址")
+            return 1
+
+    try:
+        proxy = parse_proxy_url(proxy_url, args.protocol)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"📡 代理: {format_proxy(proxy)}")
+    print(f"📈 并发级别: {','.join(str(level) for level in args.concurrency)}，每级 {args.duration}s")
+
+    result = {'target': None, 'levels': [], 'saturation': None, 'interrupted': False}
+    try:
+        run_async(run_benchmark(args, proxy, result))
+    except KeyboardInterrupt:
+        # Python 3.11之前 Ctrl+C 不会传入协程，已完成的级别仍保存在 result 中
+        result['interrupted'] = True
+
+    print("-" * 60)
+    if result['interrupted']:
+        if not result['levels']:
+            print("👋 压测已中断，没有已完成的并发级别")
+            return 0
+        print(f"⚠️  压测已中断，保存已完成的 {len(result['levels'])} 个并发级别")
+
+    saturation = result['saturation']
+    if saturation and saturation['concurrency'] is not None:
+        reason = "错误率超限" if saturation['reason'] == 'error_rate' else "吞吐量不再提升"
+        print(f"📌 饱和点: 并发 {saturation['concurrency']}，{saturation['rps']} 请求/秒 "
+              f"(并发 {saturation['detected_at']} 时{reason})")
+    elif saturation:
+        print("📌 首个并发级别即超过错误率阈值，请检查代理是否可用")
+    elif result['interrupted']:
+        print("📌 在已完成的并发级别内未达到饱和")
+    else:
+        print("📌 在测试的并发范围内未达到饱和")
+
+    report = {
+        'tool': 'proxy_bench',
+        'label': args.label,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'proxy': format_proxy(proxy),
+        'mode': args.mode,
+        'config': {
+            'concurrency': args.concurrency,
+            'duration_s': args.duration,
+            'timeout_s': args.timeout,
+            'payload_size': args.payload_size,
+            'min_gain': args.min_gain,
+            'max_error_rate': args.max_error_rate,
+        },
+    }
+    report.update(result)
+
+    output = args.output or time.strftime('proxy_bench_%Y%m%d_%H%M%S.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"💾 结果已保存: {output}")
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n👋 用户取消操作，再见！")
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n❌ 发生错误: {e}")
+        sys.exit(1)
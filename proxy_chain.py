@@ -0,0 +1,417 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+代理链脚本
+支持多跳代理链，例如: http://a:3128 -> socks5://b:1080
+- check: 逐跳建立代理链并统计每一跳的延迟，找出最慢的一跳
+- serve: 在本地提供单一代理入口（HTTP/SOCKS5），可直接配置给Git和系统代理
+"""
+
+import argparse
+import asyncio
+import ipaddress
+import statistics
+import struct
+import sys
+import time
+from urllib.parse import urlsplit
+
+from proxy_tunnel import (
+    HANDSHAKES,
+    ProxyError,
+    format_host_port,
+    format_proxy,
+    parse_host_port,
+    parse_proxy_url,
+    positive_float,
+    positive_int,
+    run_async,
+)
+
+
+CHAIN_SEPARATOR = '->'
+FAILURE_REPORT_INTERVAL = 10.0
+DEFAULT_LISTEN = "127.0.0.1:10820"
+DEFAULT_TARGET = "github.com:443"
+
+
+def parse_chain(spec, default_scheme="http"):
+    """解析代理链，各跳之间用 -> 分隔"""
+    hops = [item.strip() for item in spec.split(CHAIN_SEPARATOR)]
+    if not all(hops):
+        raise ValueError(f"代理链格式错误: {spec}")
+    return [parse_proxy_url(hop, default_scheme) for hop in hops]
+
+
+def format_chain(hops):
+    """格式化代理链（隐藏密码）"""
+    return f" {CHAIN_SEPARATOR} ".join(format_proxy(hop) for hop in hops)
+
+
+async def open_chain(hops, host, port, timeout):
+    """逐跳建立代理链到目标的隧道，返回 (reader, writer, [(起点, 终点, 链路往返耗时, 步骤耗时)])"""
+    timings = []
+    started = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(hops[0].host, hops[0].port), timeout
+        )
+    except (OSError, asyncio.TimeoutError) as e:
+        raise ProxyError(
+            f"第1跳 本机 连接 {format_proxy(hops[0])} 失败: {type(e).__name__} {e}"
+        ) from e
+    # TCP握手即一次到第一跳的往返
+    hop_rtt = time.perf_counter() - started
+    timings.append(('本机', format_host_port(hops[0].host, hops[0].port), hop_rtt, hop_rtt))
+
+    try:
+        for index, hop in enumerate(hops):
+            if index + 1 < len(hops):
+                next_host, next_port = hops[index + 1].host, hops[index + 1].port
+            else:
+                next_host, next_port = host, port
+            round_trips = []
+            started = time.perf_counter()
+            try:
+                await asyncio.wait_for(
+                    HANDSHAKES[hop.scheme](
+                        reader, writer, next_host, next_port, hop.username, hop.password, round_trips
+                    ),
+                    timeout
+                )
+            except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError, ProxyError) as e:
+                # 标明失败的是哪一跳，便于定位
+                raise ProxyError(
+                    f"第{index + 1}跳 {format_proxy(hop)} 连接 {format_host_port(next_host, next_port)} "
+                    f"失败: {type(e).__name__} {e}"
+                ) from e
+            step = time.perf_counter() - started
+            # 经该跳的请求要先穿过前面各跳，需扣除到该跳的往返时间才是本段链路自身耗时；
+            # 有多次往返时（如SOCKS5问候）首次往返即到该跳的往返时间，否则沿用上一段的累计值
+            if len(round_trips) > 1:
+                hop_rtt = round_trips[0]
+            next_rtt = round_trips[-1]
+            timings.append((
+                format_host_port(hop.host, hop.port),
+                format_host_port(next_host, next_port),
+                max(next_rtt - hop_rtt, 0.0),
+                step
+            ))
+            hop_rtt = next_rtt
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer, timings
+
+
+async def check_chain(hops, host, port, rounds, timeout):
+    """多轮建立代理链，返回每轮的逐跳耗时"""
+    results = []
+    for _ in range(rounds):
+        try:
+            _, writer, timings = await open_chain(hops, host, port, timeout)
+        except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError, ProxyError) as e:
+            results.append((None, e))
+            continue
+        writer.close()
+        results.append((timings, None))
+    return results
+
+
+def display_check(target, results):
+    """显示代理链检查结果"""
+    succeeded = [timings for timings, _ in results if timings is not None]
+    failures = [error for _, error in results if error is not None]
+
+    print(f"\n📋 代理链检查结果 (目标: {target}):")
+    print("-" * 60)
+    if not succeeded:
+        if failures:
+            print(f"❌ 代理链建立失败: {type(failures[-1]).__name__}: {failures[-1]}")
+        else:
+            print("❌ 未进行任何检查")
+        print("-" * 60)
+        return False
+
+    print("💡 每段耗时为该段链路自身的往返时间，已扣除经前面各跳的往返")
+    links = [(source, dest) for source, dest, _, _ in succeeded[0]]
+    medians = []
+    for index, (source, dest) in enumerate(links):
+        values = [timings[index][2] * 1000 for timings in succeeded]
+        medians.append(statistics.median(values))
+        print(f"{index + 1}. {source} -> {dest}")
+        print(f"   中位数: {medians[-1]:.2f} ms    最大: {max(values):.2f} ms")
+
+    totals = [sum(item[3] for item in timings) * 1000 for timings in succeeded]
+    slowest = max(range(len(links)), key=lambda index: medians[index])
+    share = medians[slowest] / sum(medians) * 100 if sum(medians) else 0.0
+    print("-" * 60)
+    print(f"⏱️  建链总耗时中位数: {statistics.median(totals):.2f} ms ({len(succeeded)}/{len(results)} 次成功)")
+    print(f"🐢 最慢的一段: {links[slowest][0]} -> {links[slowest][1]} (占链路往返的 {share:.0f}%)")
+    if failures:
+        print(f"⚠️  失败 {len(failures)} 次，最后一次: {type(failures[-1]).__name__}: {failures[-1]}")
+    print("-" * 60)
+    return True
+
+
+async def pipe(reader, writer):
+    """单向转发数据，读到EOF时只半关闭对端，连接由调用方在双向结束后关闭"""
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        # 连接异常时直接关闭，让另一个方向也尽快结束
+        writer.close()
+        return
+    if writer.can_write_eof():
+        writer.write_eof()
+    else:
+        writer.close()
+
+
+class ClientRejected(ProxyError):
+    """客户端请求被拒绝，response 为应答给客户端的数据"""
+
+    def __init__(self, message, response):
+        super().__init__(message)
+        self.response = response
+
+
+def socks5_reply(code):
+    """构造SOCKS5应答"""
+    return b"\x05" + bytes([code]) + b"\x00\x01" + b"\x00" * 6
+
+
+async def accept_socks5(reader, writer):
+    """处理SOCKS5客户端握手，返回目标 (主机, 端口)"""
+    count = (await reader.readexactly(1))[0]
+    methods = await reader.readexactly(count)
+    if 0 not in methods:
+        raise ClientRejected("SOCKS5客户端未提供无认证方式", b"\x05\xff")
+    writer.write(b"\x05\x00")
+
+    _, command, _, address_type = await reader.readexactly(4)
+    if command != 1:
+        raise ClientRejected(f"不支持的SOCKS5命令: {command}", socks5_reply(7))
+    if address_type == 1:
+        host = str(ipaddress.IPv4Address(await reader.readexactly(4)))
+    elif address_type == 4:
+        host = str(ipaddress.IPv6Address(await reader.readexactly(16)))
+    elif address_type == 3:
+        length = (await reader.readexactly(1))[0]
+        host = (await reader.readexactly(length)).decode('idna')
+    else:
+        raise ClientRejected(f"不支持的SOCKS5地址类型: {address_type}", socks5_reply(8))
+    port = struct.unpack("!H", await reader.readexactly(2))[0]
+    return host, port
+
+
+def rewrite_http_request(header):
+    """将代理形式的HTTP请求改写为直连形式，返回 (主机, 端口, 新请求头)"""
+    lines = header.decode('latin-1').split("\r\n")
+    method, url, version = lines[0].split(' ', 2)
+    parts = urlsplit(url)
+    if parts.scheme != 'http' or not parts.hostname:
+        raise ProxyError(f"不支持的HTTP代理请求: {lines[0]}")
+
+    path = parts.path or '/'
+    if parts.query:
+        path = f"{path}?{parts.query}"
+    skipped = ('proxy-connection:', 'proxy-authorization:', 'connection:', 'keep-alive:')
+    headers = [line for line in lines[1:] if line and not line.lower().startswith(skipped)]
+    headers.append("Connection: close")
+    request = "\r\n".join([f"{method} {path} {version}"] + headers) + "\r\n\r\n"
+    return parts.hostname, parts.port or 80, request.encode('latin-1')
+
+
+class FailureReporter:
+    """转发失败提示：verbose 时逐条输出，否则每隔一段时间汇总为一行"""
+
+    def __init__(self, verbose=False, interval=FAILURE_REPORT_INTERVAL):
+        self.verbose = verbose
+        self.interval = interval
+        self.count = 0
+        self.last_error = None
+        self.last_report = None
+
+    def report(self, error):
+        """记录一次转发失败"""
+        message = f"{type(error).__name__}: {error}"
+        if self.verbose:
+            print(f"⚠️  转发失败: {message}")
+            return
+        self.count += 1
+        self.last_error = message
+        now = time.monotonic()
+        if self.last_report is None or now - self.last_report >= self.interval:
+            self.flush()
+            self.last_report = now
+
+    def flush(self):
+        """输出尚未汇总的失败次数"""
+        if self.count:
+            print(f"⚠️  转发失败 {self.count} 次，最近一次: {self.last_error} (使用 --verbose 查看每次失败)")
+            self.count = 0
+
+
+async def handle_client(reader, writer, hops, timeout, failures):
+    """本地代理入口：接受HTTP/SOCKS5请求并经代理链转发"""
+    upstream_writer = None
+    protocol = None
+    replied = False
+    try:
+        first = await asyncio.wait_for(reader.readexactly(1), timeout)
+        if first == b"\x05":
+            protocol = 'socks5'
+            host, port = await asyncio.wait_for(accept_socks5(reader, writer), timeout)
+            upstream_reader, upstream_writer, _ = await open_chain(hops, host, port, timeout)
+            writer.write(socks5_reply(0))
+        else:
+            protocol = 'http'
+            header = first + await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+            method, target = header.split(b" ", 2)[:2]
+            if method.upper() == b"CONNECT":
+                host, port = parse_host_port(target.decode('latin-1'))
+                upstream_reader, upstream_writer, _ = await open_chain(hops, host, port, timeout)
+                writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+            else:
+                host, port, request = rewrite_http_request(header)
+                upstream_reader, upstream_writer, _ = await open_chain(hops, host, port, timeout)
+                upstream_writer.write(request)
+        replied = True
+        await writer.drain()
+        await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+    except (OSError, EOFError, asyncio.TimeoutError, asyncio.LimitOverrunError, ProxyError, ValueError) as e:
+        # 每个连接只应答一次，握手阶段的拒绝应答由 ClientRejected 携带
+        if replied:
+            pass
+        elif isinstance(e, ClientRejected):
+            writer.write(e.response)
+        elif protocol == 'http':
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+        elif protocol == 'socks5':
+            writer.write(socks5_reply(1))
+        if protocol is not None:
+            failures.report(e)
+    finally:
+        writer.close()
+        if upstream_writer is not None:
+            upstream_writer.close()
+
+
+async def serve_chain(hops, listen_host, listen_port, timeout, apply_git=False, apply_system=False,
+                      verbose=False):
+    """启动本地代理入口并持续运行"""
+    failures = FailureReporter(verbose)
+    connections = set()
+
+    async def handler(reader, writer):
+        # 客户端半关闭后不再注册读取事件，需持有处理任务的引用，避免转发中途被垃圾回收
+        task = asyncio.ensure_future(handle_client(reader, writer, hops, timeout, failures))
+        connections.add(task)
+        task.add_done_callback(connections.discard)
+
+    server = await asyncio.start_server(handler, listen_host, listen_port, backlog=1024)
+    print(f"🚀 本地代理入口已启动: {format_host_port(listen_host, listen_port)} (HTTP/SOCKS5)")
+    print(f"🔗 代理链: {format_chain(hops)}")
+    apply_endpoint(listen_host, listen_port, apply_git, apply_system)
+    print("💡 按 Ctrl+C 停止")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        server.close()
+        await server.wait_closed()
+        failures.flush()
+
+
+def apply_endpoint(listen_host, listen_port, apply_git, apply_system):
+    """将Git和系统代理指向本地代理入口"""
+    endpoint = format_host_port(listen_host, listen_port)
+    if apply_git:
+        from git_proxy import set_proxy as set_git_proxy
+        set_git_proxy(f"http://{endpoint}")
+    if apply_system:
+        from system_proxy import SystemProxyManager
+        proxy_manager = SystemProxyManager()
+        print(f"正在设置系统代理为: {endpoint}")
+        if proxy_manager.set_proxy(endpoint):
+            print("✅ 系统代理设置成功！")
+        else:
+            print("❌ 设置代理失败")
+    if apply_git or apply_system:
+        print("💡 停止代理链后，请运行 git_proxy.py / system_proxy.py 取消代理设置")
+
+
+def build_parser():
+    """构建命令行参数"""
+    parser = argparse.ArgumentParser(description="代理链工具：逐跳检查延迟，或在本地提供代理链入口")
+    parser.add_argument('--protocol', choices=['http', 'socks5', 'socks4'], default='http',
+                        help="代理地址未带协议前缀时使用的协议 (默认: http)")
+    parser.add_argument('--timeout', type=positive_float, default=10.0, help="每一跳的超时秒数 (默认: 10)")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    check = subparsers.add_parser('check', help="逐跳建立代理链并统计每一跳的延迟")
+    check.add_argument('chain', help='代理链，例如 "http://a:3128 -> socks5://b:1080"')
+    check.add_argument('--target', default=DEFAULT_TARGET, help=f"目标 主机:端口 (默认: {DEFAULT_TARGET})")
+    check.add_argument('--rounds', type=positive_int, default=5, help="检查轮数 (默认: 5)")
+
+    serve = subparsers.add_parser('serve', help="在本地提供代理链入口")
+    serve.add_argument('chain', help='代理链，例如 "http://a:3128 -> socks5://b:1080"')
+    serve.add_argument('--listen', default=DEFAULT_LISTEN, help=f"监听地址 (默认: {DEFAULT_LISTEN})")
+    serve.add_argument('--check', metavar='TARGET', help="启动前先经代理链检查到该 主机:端口 的连通性")
+    serve.add_argument('--apply-git', action='store_true', help="将Git代理设置为本地入口")
+    serve.add_argument('--apply-system', action='store_true', help="将系统代理设置为本地入口")
+    serve.add_argument('--verbose', action='store_true',
+                       help=f"逐条输出转发失败 (默认每 {FAILURE_REPORT_INTERVAL:.0f} 秒汇总一次)")
+    return parser
+
+
+def main(argv=None):
+    """主函数"""
+    args = build_parser().parse_args(argv)
+
+    print("🔧 代理链工具")
+    print("=" * 60)
+
+    try:
+        hops = parse_chain(args.chain, args.protocol)
+        if args.command == 'check':
+            target_host, target_port = parse_host_port(args.target)
+        else:
+            listen_host, listen_port = parse_host_port(args.listen)
+            if args.check:
+                target_host, target_port = parse_host_port(args.check)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return 1
+
+    print(f"🔗 代理链: {format_chain(hops)}")
+
+    if args.command == 'check' or args.check:
+        rounds = args.rounds if args.command == 'check' else 1
+        results = run_async(check_chain(hops, target_host, target_port, rounds, args.timeout))
+        if not display_check(format_host_port(target_host, target_port), results):
+            return 1
+        if args.command == 'check':
+            return 0
+
+    run_async(serve_chain(
+        hops, listen_host, listen_port, args.timeout, args.apply_git, args.apply_system, args.verbose
+    ))
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        print("\n\n👋 用户取消操作，再见！")
+        sys.exit(0)
+    except Exception as e:
+        print(f"\n❌ 发生错误: {e}")
+        sys.exit(1)
@@ -0,0 +1,264 @@
+# -*- coding: utf-8 -*-
+"""
+代理隧道公共模块
+提供代理地址解析、HTTP CONNECT/SOCKS5/SOCKS4握手及命令行参数校验等公共函数，
+供 proxy_bench.py 和 proxy_chain.py 使用
+"""
+
+import argparse
+import asyncio
+import base64
+import ipaddress
+import math
+import struct
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit, unquote
+
+
+ProxyEndpoint = namedtuple('ProxyEndpoint', ['scheme', 'host', 'port', 'username', 'password'])
+
+SCHEME_ALIASES = {
+    'http': 'http',
+    'https': 'http',
+    'socks5': 'socks5',
+    'socks5h': 'socks5',
+    'socks4': 'socks4',
+    'socks4a': 'socks4',
+}
+
+SOCKS5_ERRORS = {
+    1: "代理服务器内部错误",
+    2: "规则不允许连接",
+    3: "网络不可达",
+    4: "主机不可达",
+    5: "连接被拒绝",
+    6: "TTL超时",
+    7: "不支持的命令",
+    8: "不支持的地址类型",
+}
+
+
+class ProxyError(Exception):
+    """代理握手失败"""
+
+
+def parse_proxy_url(proxy_url, default_scheme="http"):
+    """解析代理地址，支持 http://、socks5://、socks4:// 前缀及 IP:端口 格式"""
+    proxy_url = proxy_url.strip()
+
+    # Windows注册表中可能是 "http=host:port;https=host:port" 形式
+    if '=' in proxy_url and '://' not in proxy_url:
+        entries = dict(
+            item.split('=', 1) for item in proxy_url.split(';') if '=' in item
+        )
+        proxy_url = entries.get('http') or entries.get('https') or next(iter(entries.values()))
+
+    if '://' not in proxy_url:
+        proxy_url = f"{default_scheme}://{proxy_url}"
+
+    parts = urlsplit(proxy_url)
+    scheme = SCHEME_ALIASES.get(parts.scheme.lower())
+    if scheme is None:
+        raise ValueError(f"不支持的代理协议: {parts.scheme}")
+    if not parts.hostname or not parts.port:
+        raise ValueError(f"代理地址缺少主机或端口: {proxy_url}")
+
+    username = unquote(parts.username) if parts.username is not None else None
+    password = unquote(parts.password) if parts.password is not None else None
+    return ProxyEndpoint(scheme, parts.hostname, parts.port, username, password)
+
+
+def format_proxy(proxy):
+    """格式化代理地址（隐藏密码）"""
+    auth = f"{proxy.username}@" if proxy.username else ""
+    return f"{proxy.scheme}://{auth}{format_host_port(proxy.host, proxy.port)}"
+
+
+def format_host_port(host, port):
+    """格式化 主机:端口，IPv6地址加方括号"""
+    if ':' in host:
+        return f"[{host}]:{port}"
+    return f"{host}:{port}"
+
+
+def parse_host_port(value):
+    """解析 主机:端口 字符串"""
+    parts = urlsplit(f"//{value}")
+    if not parts.hostname or not parts.port:
+        raise ValueError(f"地址格式应为 主机:端口 : {value}")
+    return parts.hostname, parts.port
+
+
+def record_round_trip(round_trips, started):
+    """记录一次请求往返耗时"""
+    if round_trips is not None:
+        round_trips.append(time.perf_counter() - started)
+
+
+async def http_connect(reader, writer, host, port, username=None, password=None, round_trips=None):
+    """通过HTTP代理的CONNECT方法建立隧道，round_trips 不为空时记录每次请求往返耗时"""
+    target = format_host_port(host, port)
+    lines = [f"CONNECT {target} HTTP/1.1", f"Host: {target}"]
+    if username is not None:
+        token = base64.b64encode(f"{username}:{password or ''}".encode('utf-8')).decode('ascii')
+        lines.append(f"Proxy-Authorization: Basic {token}")
+    started = time.perf_counter()
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('utf-8'))
+    await writer.drain()
+
+    header = await reader.readuntil(b"\r\n\r\n")
+    record_round_trip(round_trips, started)
+    status_line = header.split(b"\r\n", 1)[0].decode('latin-1')
+    fields = status_line.split(None, 2)
+    if len(fields) < 2 or not fields[1].startswith('2'):
+        raise ProxyError(f"HTTP代理拒绝连接: {status_line}")
+
+
+def encode_socks5_address(host):
+    """编码SOCKS5目标地址"""
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        name = host.encode('idna')
+        return b"\x03" + bytes([len(name)]) + name
+    if address.version == 4:
+        return b"\x01" + address.packed
+    return b"\x04" + address.packed
+
+
+async def socks5_connect(reader, writer, host, port, username=None, password=None, round_trips=None):
+    """通过SOCKS5代理建立隧道，round_trips 不为空时记录每次请求往返耗时"""
+    methods = b"\x00\x02" if username is not None else b"\x00"
+    started = time.perf_counter()
+    writer.write(b"\x05" + bytes([len(methods)]) + methods)
+    await writer.drain()
+
+    version, method = await reader.readexactly(2)
+    record_round_trip(round_trips, started)
+    if version != 5:
+        raise ProxyError("SOCKS5代理响应版本错误")
+    if method == 2 and username is not None:
+        user = username.encode('utf-8')
+        pwd = (password or "").encode('utf-8')
+        started = time.perf_counter()
+        writer.write(b"\x01" + bytes([len(user)]) + user + bytes([len(pwd)]) + pwd)
+        await writer.drain()
+        _, status = await reader.readexactly(2)
+        record_round_trip(round_trips, started)
+        if status != 0:
+            raise ProxyError("SOCKS5认证失败")
+    elif method != 0:
+        raise ProxyError("SOCKS5代理不支持的认证方式")
+
+    started = time.perf_counter()
+    writer.write(b"\x05\x01\x00" + encode_socks5_address(host) + struct.pack("!H", port))
+    await writer.drain()
+
+    _, reply, _, address_type = await reader.readexactly(4)
+    record_round_trip(round_trips, started)
+    if reply != 0:
+        raise ProxyError(f"SOCKS5连接失败: {SOCKS5_ERRORS.get(reply, reply)}")
+    if address_type == 1:
+        await reader.readexactly(4 + 2)
+    elif address_type == 4:
+        await reader.readexactly(16 + 2)
+    elif address_type == 3:
+        length = (await reader.readexactly(1))[0]
+        await reader.readexactly(length + 2)
+    else:
+        raise ProxyError("SOCKS5代理返回未知地址类型")
+
+
+async def socks4_connect(reader, writer, host, port, username=None, password=None, round_trips=None):
+    """通过SOCKS4/4a代理建立隧道（域名使用4a扩展），round_trips 不为空时记录请求往返耗时"""
+    try:
+        address = ipaddress.IPv4Address(host).packed
+        suffix = b""
+    except ValueError:
+        address = b"\x00\x00\x00\x01"
+        suffix = host.encode('idna') + b"\x00"
+    user_id = (username or "").encode('utf-8') + b"\x00"
+    started = time.perf_counter()
+    writer.write(b"\x04\x01" + struct.pack("!H", port) + address + user_id + suffix)
+    await writer.drain()
+
+    response = await reader.readexactly(8)
+    record_round_trip(round_trips, started)
+    if response[1] != 0x5A:
+        raise ProxyError(f"SOCKS4连接失败: 0x{response[1]:02X}")
+
+
+HANDSHAKES = {
+    'http': http_connect,
+    'socks5': socks5_connect,
+    'socks4': socks4_connect,
+}
+
+
+async def open_tunnel(proxy, host, port, timeout):
+    """经代理建立到目标的隧道，返回 (reader, writer)"""
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(proxy.host, proxy.port), timeout
+    )
+    try:
+        await asyncio.wait_for(
+            HANDSHAKES[proxy.scheme](reader, writer, host, port, proxy.username, proxy.password),
+            timeout
+        )
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+def run_async(coroutine):
+    """运行协程（兼容Python 3.6）"""
+    if hasattr(asyncio, 'run'):
+        return asyncio.run(coroutine)
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
+
+def positive_int(value):
+    """解析正整数参数"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"应为正整数: {value}")
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"应为正整数: {value}")
+    return number
+
+
+def positive_float(value):
+    """解析正数参数"""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"应为正数: {value}")
+    if not number > 0 or math.isinf(number):
+        raise argparse.ArgumentTypeError(f"应为正数: {value}")
+    return number
+
+
+def non_negative_float(value):
+    """解析非负数参数"""
+    try:
+        number = float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"应为非负数: {value}")
+    if not number >= 0 or math.isinf(number):
+        raise argparse.ArgumentTypeError(f"应为非负数: {value}")
+    return number
+
+
+def ratio(value):
+    """解析 0 到 1 之间的比例参数"""
+    number = non_negative_float(value)
+    if number > 1:
+        raise argparse.ArgumentTypeError(f"应为 0 到 1 之间的数: {value}")
+    return number